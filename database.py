@@ -5,32 +5,67 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import ConnectionFailure
 from datetime import datetime, timezone
 import os
+import logging
 from dotenv import load_dotenv
-from typing import Union
+from typing import List, Union
 from pydantic import BaseModel
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 _client = None
 db = None
 
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
+# Seconds a semantic chat-cache entry lives before MongoDB expires it
+CHAT_CACHE_TTL = int(os.getenv("CHAT_CACHE_TTL", str(7 * 24 * 3600)))
 
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    _client = AsyncIOMotorClient(database_url)
     db = _client[database_name]
 
-# Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
+# Supporting query indexes as (collection, keys, create_index options)
+_INDEXES = [
+    ("material", [("user_id", 1), ("_id", 1)], {}),
+    ("emotionlog", [("user_id", 1), ("emotion", 1)], {}),
+    ("chatmessage", [("user_id", 1), ("created_at", -1), ("_id", -1)], {}),
+    ("chat_cache", [("emotion_hint", 1), ("created_at", -1)], {}),
+    ("chat_cache", "created_at", {"expireAfterSeconds": CHAT_CACHE_TTL}),
+]
+
+async def ensure_unique_email_index() -> bool:
+    """Build the unique index on user.email; returns False (and logs) if it can't be built"""
     if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+        return False
+    try:
+        await db["user"].create_index("email", unique=True)
+    except Exception:
+        logger.exception("Could not build unique index on user.email; registration will check for duplicates itself")
+        return False
+    return True
+
+async def ensure_indexes():
+    """Create the supporting query indexes, logging and skipping any that fail"""
+    if db is None:
+        return
+    for collection, keys, options in _INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except ConnectionFailure:
+            logger.exception("MongoDB unreachable; skipping remaining index creation")
+            return
+        except Exception:
+            logger.exception("Could not create index %s on %s", keys, collection)
 
+# Helper functions for common database operations
+def _stamp(data: Union[BaseModel, dict]) -> dict:
     # Convert Pydantic model to dict if needed
     if isinstance(data, BaseModel):
         data_dict = data.model_dump()
@@ -39,17 +74,31 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
 
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
+    return data_dict
 
-    result = db[collection_name].insert_one(data_dict)
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    result = await db[collection_name].insert_one(_stamp(data))
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+async def create_documents(collection_name: str, items: List[Union[BaseModel, dict]]):
+    """Insert several documents with timestamps in one round-trip"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    result = await db[collection_name].insert_many([_stamp(d) for d in items])
+    return [str(i) for i in result.inserted_ids]
+
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get documents from collection, optionally returning only the projected fields"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
     
-    cursor = db[collection_name].find(filter_dict or {})
+    cursor = db[collection_name].find(filter_dict or {}, projection)
     if limit:
         cursor = cursor.limit(limit)
     
-    return list(cursor)
+    return await cursor.to_list(length=None)
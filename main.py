@@ -1,25 +1,93 @@
 import os
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends
+import asyncio
+import logging
+from contextlib import aclosing, asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Optional
 from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
 from hashlib import sha256
+import hmac
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+import httpx
+import numpy as np
+from cachetools import TTLCache
+from openai import APIConnectionError, InternalServerError, RateLimitError
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential
 
-from database import db, create_document, get_documents
+from database import db, create_document, create_documents, get_documents, ensure_indexes, ensure_unique_email_index
 
-# LLM client (optional, falls back if not configured)
+logger = logging.getLogger(__name__)
+
+# LLM client (optional, falls back if not configured). Created on startup so
+# its connection pool lives exactly as long as the app.
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 openai_client = None
-try:
-    if OPENAI_API_KEY:
-        from openai import OpenAI
-        openai_client = OpenAI()
-except Exception:
-    openai_client = None
+# Set on startup once the unique index on user.email is confirmed; until then
+# register looks for an existing account before inserting
+email_index_ready = False
+index_task = None
+# Caps in-flight LLM calls per process so bursts stay under the rate limit
+LLM_SEM = asyncio.Semaphore(int(os.getenv("LLM_CONCURRENCY", "8")))
+# Embedding calls are short and separately rate-limited; keep them off LLM_SEM
+EMBED_SEM = asyncio.Semaphore(int(os.getenv("EMBED_CONCURRENCY", "16")))
+
+app = FastAPI(title="EduSense API", default_response_class=ORJSONResponse)
+
+
+@app.on_event("startup")
+async def open_llm_client():
+    global openai_client
+    try:
+        if OPENAI_API_KEY:
+            # aiohttp-backed transport: the default httpx pool degrades badly
+            # past ~50 in-flight requests.
+            from openai import AsyncOpenAI, DefaultAioHttpClient
+            # max_retries=0: chat_completion_stream's tenacity loop is the only
+            # retry layer, so no SDK backoff sleep runs while an LLM_SEM slot is held
+            openai_client = AsyncOpenAI(
+                max_retries=0,
+                http_client=DefaultAioHttpClient(
+                    limits=httpx.Limits(max_connections=256, max_keepalive_connections=256),
+                ),
+            )
+    except Exception:
+        logger.exception("Could not create the OpenAI client; /chat will use the fallback reply")
+        openai_client = None
+
 
-app = FastAPI(title="EduSense API")
+async def build_indexes():
+    # failures are logged by the helpers and don't keep the API down
+    global email_index_ready
+    email_index_ready = await ensure_unique_email_index()
+    await ensure_indexes()
+
+
+@app.on_event("startup")
+async def create_indexes():
+    # run in the background: with Mongo unreachable each create_index waits out
+    # the server-selection timeout, and workers shouldn't refuse traffic meanwhile
+    global index_task
+    index_task = asyncio.create_task(build_indexes())
+
+
+@app.on_event("shutdown")
+async def cancel_index_build():
+    if index_task is not None and not index_task.done():
+        index_task.cancel()
+
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    global openai_client
+    if openai_client is not None:
+        await openai_client.close()
+        openai_client = None
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,34 +99,79 @@ app.add_middleware(
 
 # ------------------- Helpers -------------------
 
+# argon2id; verify/hash are CPU-bound by design, so call them via run_in_threadpool
+password_hasher = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=1)
+
+# verified against when the email is unknown, so a failed login costs one
+# argon2 verify either way and timing doesn't reveal which emails exist
+_DUMMY_PASSWORD_HASH = password_hasher.hash("edusense-dummy-password")
+
 def hash_password(password: str) -> str:
-    return sha256(password.encode()).hexdigest()
+    return password_hasher.hash(password)
+
+
+def verify_password(password_hash: Optional[str], password: str) -> bool:
+    if not password_hash:
+        return False
+    if not password_hash.startswith("$argon2"):
+        # accounts registered before argon2 store a bare sha256 hexdigest
+        return hmac.compare_digest(password_hash, sha256(password.encode()).hexdigest())
+    try:
+        return password_hasher.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def password_needs_rehash(password_hash: str) -> bool:
+    return not password_hash.startswith("$argon2") or password_hasher.check_needs_rehash(password_hash)
 
 
 def to_public(doc):
+    # mutates in place: documents come fresh from the driver and aren't reused
     if not doc:
         return doc
-    d = dict(doc)
-    if "_id" in d:
-        d["id"] = str(d.pop("_id"))
-    return d
-
-
-def get_recent_chat_history(user_id: str, limit: int = 8):
+    if "_id" in doc:
+        doc["id"] = str(doc.pop("_id"))
+    return doc
+
+
+# Last HISTORY_LIMIT turns per user, kept briefly so back-to-back messages
+# skip the history query; refreshed on every write from this process. Writes
+# from other workers can't invalidate it, so it is opt-in (HISTORY_CACHE=1) and
+# only safe when a single worker serves the app.
+HISTORY_LIMIT = 8
+history_cache = TTLCache(maxsize=10_000, ttl=30) if os.getenv("HISTORY_CACHE") == "1" else None
+
+async def get_recent_chat_history(user_id: str, limit: int = HISTORY_LIMIT):
+    cached = history_cache.get(user_id) if history_cache is not None else None
+    if cached is not None and limit <= HISTORY_LIMIT:
+        return cached[-limit:]
     try:
-        cursor = db["chatmessage"].find({"user_id": user_id}).sort("created_at", -1).limit(limit)
-        items = list(cursor)
+        # _id breaks ties between a user/assistant pair stored in one insert_many
+        cursor = db["chatmessage"].find({"user_id": user_id}).sort([("created_at", -1), ("_id", -1)]).limit(limit)
+        items = await cursor.to_list(length=limit)
         items.reverse()  # oldest first for chat completion
         history = []
         for it in items:
             role = it.get("role", "user")
             content = it.get("content", "")
             history.append({"role": role, "content": content})
+        if history_cache is not None and limit >= HISTORY_LIMIT:
+            history_cache[user_id] = history[-HISTORY_LIMIT:]
         return history
     except Exception:
         return []
 
 
+def remember_chat_history(user_id: str, docs):
+    # only extend an entry we already hold; a miss is filled from Mongo on next read
+    cached = history_cache.get(user_id) if history_cache is not None else None
+    if cached is None:
+        return
+    turns = [{"role": d.get("role", "user"), "content": d.get("content", "")} for d in docs]
+    history_cache[user_id] = (cached + turns)[-HISTORY_LIMIT:]
+
+
 # ------------------- Auth -------------------
 class RegisterRequest(BaseModel):
     name: str
@@ -71,23 +184,32 @@ class LoginRequest(BaseModel):
 
 @app.post("/auth/register")
 async def register(payload: RegisterRequest):
-    # check existing
-    exists = list(db["user"].find({"email": payload.email}))
-    if exists:
+    # uniqueness is enforced by the unique index on email once it exists
+    if not email_index_ready and await db["user"].find_one({"email": payload.email}, {"_id": 1}):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    try:
+        user_id = await create_document("user", {
+            "name": payload.name,
+            "email": payload.email,
+            "password_hash": await run_in_threadpool(hash_password, payload.password),
+            "avatar_url": None,
+        })
+    except DuplicateKeyError:
         raise HTTPException(status_code=400, detail="Email already registered")
-    user_id = create_document("user", {
-        "name": payload.name,
-        "email": payload.email,
-        "password_hash": hash_password(payload.password),
-        "avatar_url": None,
-    })
     return {"user_id": user_id}
 
 @app.post("/auth/login")
 async def login(payload: LoginRequest):
-    user = db["user"].find_one({"email": payload.email})
-    if not user or user.get("password_hash") != hash_password(payload.password):
+    user = await db["user"].find_one({"email": payload.email})
+    if not user:
+        await run_in_threadpool(verify_password, _DUMMY_PASSWORD_HASH, payload.password)
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if not await run_in_threadpool(verify_password, user.get("password_hash"), payload.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    # upgrade legacy sha256 hashes (and outdated argon2 parameters) on successful login
+    if password_needs_rehash(user["password_hash"]):
+        new_hash = await run_in_threadpool(hash_password, payload.password)
+        await db["user"].update_one({"_id": user["_id"]}, {"$set": {"password_hash": new_hash}})
     return {"user_id": str(user["_id"]), "name": user.get("name"), "email": user.get("email")}
 
 # ------------------- Materials -------------------
@@ -99,7 +221,7 @@ class MaterialCreate(BaseModel):
 
 @app.post("/materials")
 async def create_material(payload: MaterialCreate):
-    mat_id = create_document("material", {
+    mat_id = await create_document("material", {
         "user_id": payload.user_id,
         "title": payload.title,
         "subject": payload.subject,
@@ -110,7 +232,8 @@ async def create_material(payload: MaterialCreate):
 
 @app.get("/materials/{user_id}")
 async def list_materials(user_id: str):
-    docs = get_documents("material", {"user_id": user_id})
+    # a listing never needs the (potentially large) raw content
+    docs = await get_documents("material", {"user_id": user_id}, projection={"title": 1, "subject": 1, "difficulty": 1})
     return [to_public(d) for d in docs]
 
 # ------------------- Videos -------------------
@@ -122,12 +245,12 @@ class VideoCreate(BaseModel):
 
 @app.post("/videos")
 async def create_video(payload: VideoCreate):
-    vid = create_document("video", payload.model_dump())
+    vid = await create_document("video", payload.model_dump())
     return {"video_id": vid}
 
 @app.get("/videos/{user_id}")
 async def list_videos(user_id: str):
-    docs = get_documents("video", {"user_id": user_id})
+    docs = await get_documents("video", {"user_id": user_id})
     return [to_public(d) for d in docs]
 
 # ------------------- Emotion logs -------------------
@@ -138,17 +261,20 @@ class EmotionLogCreate(BaseModel):
 
 @app.post("/emotions")
 async def log_emotion(payload: EmotionLogCreate):
-    log_id = create_document("emotionlog", payload.model_dump())
+    log_id = await create_document("emotionlog", payload.model_dump())
     return {"log_id": log_id}
 
 @app.get("/emotions/summary/{user_id}")
 async def emotion_summary(user_id: str):
-    logs = get_documents("emotionlog", {"user_id": user_id})
-    # Simple frequency summary
-    freq = {}
-    for l in logs:
-        e = l.get("emotion", "neutral")
-        freq[e] = freq.get(e, 0) + 1
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    # Simple frequency summary, counted server-side
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": {"$ifNull": ["$emotion", "neutral"]}, "c": {"$sum": 1}}},
+    ]
+    rows = await db["emotionlog"].aggregate(pipeline).to_list(length=None)
+    freq = {r["_id"]: r["c"] for r in rows}
     total = sum(freq.values()) or 1
     growth = {k: v/total for k, v in freq.items()}
     return {"frequency": freq, "distribution": growth, "total": total}
@@ -159,24 +285,41 @@ class AdaptRequest(BaseModel):
     material_id: Optional[str] = None
     latest_emotion: str
 
+# Rules based on emotion (shared across requests; treat as read-only)
+EMOTION_RULES = {
+    "sad": {"strategy": "Make it playful", "difficulty": "normal", "activities": ["puzzle", "flashcards"]},
+    "confused": {"strategy": "Simplify & add examples", "difficulty": "easy"},
+    "angry": {"strategy": "Calm & simplify", "difficulty": "easy"},
+    "happy": {"strategy": "Challenge more", "difficulty": "hard"},
+    "neutral": {"strategy": "Keep steady", "difficulty": "normal"},
+}
+
+SUGGESTED_INTRO = {
+    "easy": "Step-by-step explanation: ",
+    "hard": "Advanced challenge: ",
+    "normal_with_activities": "Interactive mode: ",
+    "normal": "Focus mode: ",
+}
+
+def _intro_for(rule: dict) -> str:
+    if rule["difficulty"] in ("easy", "hard"):
+        return SUGGESTED_INTRO[rule["difficulty"]]
+    return SUGGESTED_INTRO["normal_with_activities" if "activities" in rule else "normal"]
+
+# Guidance prefix per emotion, computed once from the rules above
+EMOTION_INTRO = {emotion: _intro_for(rule) for emotion, rule in EMOTION_RULES.items()}
+
 @app.post("/adapt")
 async def adapt_content(payload: AdaptRequest):
-    # Rules based on emotion
-    mapping = {
-        "sad": {"strategy": "Make it playful", "difficulty": "normal", "activities": ["puzzle", "flashcards"]},
-        "confused": {"strategy": "Simplify & add examples", "difficulty": "easy"},
-        "angry": {"strategy": "Calm & simplify", "difficulty": "easy"},
-        "happy": {"strategy": "Challenge more", "difficulty": "hard"},
-        "neutral": {"strategy": "Keep steady", "difficulty": "normal"},
-    }
-    rule = mapping.get(payload.latest_emotion, mapping["neutral"])
+    emotion = payload.latest_emotion if payload.latest_emotion in EMOTION_RULES else "neutral"
+    rule = EMOTION_RULES[emotion]
 
     material = None
-    if payload.material_id:
-        try:
-            material = db["material"].find_one({"_id": ObjectId(payload.material_id)})
-        except Exception:
-            material = None
+    if payload.material_id and ObjectId.is_valid(payload.material_id):
+        material = await db["material"].find_one(
+            {"_id": ObjectId(payload.material_id)},
+            projection={"title": 1, "subject": 1, "difficulty": 1},
+        )
 
     response = {
         "policy": rule,
@@ -185,14 +328,7 @@ async def adapt_content(payload: AdaptRequest):
 
     # If material present, return a modified suggestion header (simple demo)
     if material:
-        header = ""  # computed guidance prefix
-        if rule["difficulty"] == "easy":
-            header = "Step-by-step explanation: "
-        elif rule["difficulty"] == "hard":
-            header = "Advanced challenge: "
-        else:
-            header = "Interactive mode: " if "activities" in rule else "Focus mode: "
-        response["suggested_intro"] = header
+        response["suggested_intro"] = EMOTION_INTRO[emotion]
 
     return response
 
@@ -210,53 +346,186 @@ SYSTEM_PROMPT = (
     "Always be supportive, focus on pedagogy (Socratic questions, bite-sized steps), and avoid long tangents."
 )
 
+# System message per emotion hint, built once; unknown hints get the plain prompt
+SYSTEM_MESSAGES = {
+    hint: {
+        "role": "system",
+        "content": SYSTEM_PROMPT + (f" Current learner emotional state: {hint}. Adjust tone accordingly." if hint else ""),
+    }
+    for hint in (None, "sad", "confused", "angry", "happy", "neutral")
+}
+
+# Tone used by the offline fallback reply
+FALLBACK_TONES = {
+    "sad": "gentle and encouraging",
+    "confused": "clear and step-by-step",
+    "angry": "calm and concise",
+    "happy": "enthusiastic and challenging",
+    None: "friendly and helpful",
+}
+
+@asynccontextmanager
+async def chat_completion_stream(messages):
+    """Open a streamed completion, holding an LLM_SEM slot until the caller is done"""
+    # Semaphore is taken per attempt so backoff sleeps don't hold a slot
+    async for attempt in AsyncRetrying(
+        # the transient errors the SDK would otherwise retry itself
+        retry=retry_if_exception_type((RateLimitError, APIConnectionError, InternalServerError)),
+        wait=wait_exponential(multiplier=0.5, max=8),
+        stop=stop_after_attempt(4),
+        reraise=True,
+    ):
+        with attempt:
+            await LLM_SEM.acquire()
+            try:
+                completion = await openai_client.chat.completions.create(
+                    model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=400,
+                    stream=True,
+                )
+            except BaseException:
+                LLM_SEM.release()
+                raise
+    try:
+        yield completion
+    finally:
+        try:
+            await completion.close()
+        finally:
+            LLM_SEM.release()
+
+
+def sse_event(data: str, event: Optional[str] = None) -> str:
+    # multi-line payloads need one data: field per line
+    head = f"event: {event}\n" if event else ""
+    return head + "".join(f"data: {line}\n" for line in data.split("\n")) + "\n"
+
+# Semantic reply cache: paraphrased opening questions with the same emotion hint
+# reuse an earlier LLM reply instead of paying for a new completion.
+CHAT_CACHE_THRESHOLD = float(os.getenv("CHAT_CACHE_THRESHOLD", "0.92"))
+CHAT_CACHE_SCAN = int(os.getenv("CHAT_CACHE_SCAN", "100"))
+
+async def embed_text(text: str):
+    async with EMBED_SEM:
+        res = await openai_client.embeddings.create(model="text-embedding-3-small", input=text)
+    return np.asarray(res.data[0].embedding, dtype=np.float32)
+
+
+async def find_cached_reply(message: str, emotion_hint: Optional[str]):
+    """Return (embedding, cached reply or None); (None, None) if embedding fails"""
+    try:
+        embedding = await embed_text(message)
+    except Exception:
+        return None, None
+    try:
+        # embeddings are stored as packed float32 bytes (6 KB each, decoded in one
+        # np.frombuffer call); older list-encoded entries are skipped
+        entries = await (
+            db["chat_cache"].find({"emotion_hint": emotion_hint, "embedding": {"$type": "binData"}}, {"embedding": 1, "reply": 1})
+            .sort("created_at", -1)
+            .limit(CHAT_CACHE_SCAN)
+            .to_list(length=CHAT_CACHE_SCAN)
+        )
+    except Exception:
+        return embedding, None
+    entries = [e for e in entries if len(e["embedding"]) == embedding.nbytes]
+    if not entries:
+        return embedding, None
+    matrix = np.frombuffer(b"".join(e["embedding"] for e in entries), dtype=np.float32).reshape(len(entries), -1)
+    # OpenAI embeddings are unit length, so the dot product is the cosine similarity
+    scores = matrix @ embedding
+    best = int(scores.argmax())
+    if scores[best] >= CHAT_CACHE_THRESHOLD:
+        return embedding, entries[best]["reply"]
+    return embedding, None
+
 @app.post("/chat")
 async def chat_with_assistant(payload: ChatMessageIn):
-    # store user message first
-    create_document("chatmessage", {"user_id": payload.user_id, "role": "user", "content": payload.message, "emotion_context": payload.emotion_hint})
+    # buffered and written together with the reply in a single insert_many once
+    # the stream ends; stream_reply still persists it from a finally on failure
+    chat_docs = [{"user_id": payload.user_id, "role": "user", "content": payload.message, "emotion_context": payload.emotion_hint}]
 
     def simple_fallback() -> str:
-        tone_map = {
-            "sad": "gentle and encouraging",
-            "confused": "clear and step-by-step",
-            "angry": "calm and concise",
-            "happy": "enthusiastic and challenging",
-            None: "friendly and helpful",
-        }
-        tone = tone_map.get(payload.emotion_hint, tone_map[None])
+        tone = FALLBACK_TONES.get(payload.emotion_hint, FALLBACK_TONES[None])
         return f"In a {tone} tone: I hear you said: '{payload.message}'. Let's work through this together."
 
-    reply = None
+    async def generate_reply():
+        if openai_client is None:
+            yield simple_fallback()
+            return
 
-    if openai_client is None:
-        reply = simple_fallback()
-    else:
+        # Build chat history
+        history = await get_recent_chat_history(payload.user_id)
+
+        # The cache is shared across learners, so only context-free turns may
+        # read or populate it; follow-ups depend on the asker's own history.
+        embedding = None
+        if not history:
+            embedding, cached = await find_cached_reply(payload.message, payload.emotion_hint)
+            if cached is not None:
+                yield cached
+                return
+
+        parts = []
         try:
-            # Build chat history
-            history = get_recent_chat_history(payload.user_id, limit=8)
             # Insert system + emotion instruction
-            system_prefix = SYSTEM_PROMPT
-            if payload.emotion_hint:
-                system_prefix += f" Current learner emotional state: {payload.emotion_hint}. Adjust tone accordingly."
-
-            messages = [{"role": "system", "content": system_prefix}] + history + [
-                {"role": "user", "content": payload.message}
-            ]
-
-            # Call OpenAI
-            completion = openai_client.chat.completions.create(
-                model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-                messages=messages,
-                temperature=0.7,
-                max_tokens=400,
-            )
-            reply = completion.choices[0].message.content.strip()
-        except Exception as e:
-            reply = simple_fallback()
+            system_msg = SYSTEM_MESSAGES.get(payload.emotion_hint, SYSTEM_MESSAGES[None])
+            messages = [system_msg, *history, {"role": "user", "content": payload.message}]
+
+            # Call OpenAI; the slot is held until the stream is drained
+            async with chat_completion_stream(messages) as completion:
+                async for chunk in completion:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+        except Exception:
+            # fall back if nothing reached the client yet; otherwise the reply
+            # is truncated and stream_reply has to report that
+            if parts:
+                raise
+            yield simple_fallback()
+            return
+
+        if embedding is not None and parts:
+            try:
+                await create_document("chat_cache", {"embedding": embedding.tobytes(), "reply": "".join(parts).strip(), "emotion_hint": payload.emotion_hint})
+            except Exception:
+                pass
+
+    async def stream_reply():
+        parts = []
+        failed = False
+        try:
+            # closed explicitly so a client disconnect releases the LLM slot and
+            # OpenAI stream right away instead of whenever the generator is GC'd
+            async with aclosing(generate_reply()) as pieces:
+                async for piece in pieces:
+                    parts.append(piece)
+                    yield sse_event(piece)
+        except Exception:
+            failed = True
+        finally:
+            reply = "".join(parts).strip()
+            if reply:
+                chat_docs.append({"user_id": payload.user_id, "role": "assistant", "content": reply, "emotion_context": payload.emotion_hint})
+            # a persist failure must not cut the stream before its terminal frame
+            try:
+                await create_documents("chatmessage", chat_docs)
+                remember_chat_history(payload.user_id, chat_docs)
+            except Exception:
+                logger.exception("Could not persist chat turn for user %s", payload.user_id)
+        if failed:
+            # lets the client tell a cut-off reply from a complete one
+            yield sse_event("Reply interrupted", event="error")
+        else:
+            yield sse_event("[DONE]")
 
-    # store assistant reply
-    create_document("chatmessage", {"user_id": payload.user_id, "role": "assistant", "content": reply, "emotion_context": payload.emotion_hint})
-    return {"reply": reply}
+    return StreamingResponse(stream_reply(), media_type="text/event-stream")
 
 # ------------------- Health -------------------
 @app.get("/")
@@ -264,7 +533,7 @@ def read_root():
     return {"message": "EduSense backend running"}
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -279,7 +548,7 @@ def test_database():
             response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
             response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
             try:
-                collections = db.list_collection_names()
+                collections = await db.list_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
                 response["connection_status"] = "Connected"
@@ -294,4 +563,6 @@ def test_database():
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # workers > 1 needs the import string; in-process caches and LLM_SEM are per worker
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers, loop="uvloop", http="httptools")